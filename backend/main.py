@@ -1,22 +1,71 @@
 from __future__ import annotations
 from fastapi import FastAPI, UploadFile, File
-from fastapi.responses import JSONResponse, FileResponse
+from fastapi.responses import ORJSONResponse, FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import nbformat as nbf
+import orjson
 from pathlib import Path
-from typing import List, Dict, Set
-import io, sys, traceback, ast
-from contextlib import redirect_stdout
+from typing import List, Dict, Set, Optional
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing as mp
+import os, asyncio, shutil, hashlib
+from contextlib import asynccontextmanager
 
 from .parser import build_graph  # still used for initial auto-graph from cells
+from .runner import ComponentResult, run_component
 
 ROOT = Path(__file__).resolve().parents[1]
 FRONTEND = ROOT / "frontend"
 UPLOADS = ROOT / "uploads"
 UPLOADS.mkdir(exist_ok=True)
 
-app = FastAPI(title="Notebook DAG Viewer", version="0.3.0")
+# User code runs in long-lived kernel processes: imports stay loaded in their sys.modules
+# across runs (each run still starts from a fresh env), and a crashing cell cannot take the
+# server down. Each kernel is its own single-process pool, and a component always goes to
+# the kernel picked by its first cell, so resumed runs of a notebook find the checkpoints
+# its earlier runs left there. VIEW_KERNELS sets how many kernels there are; each one
+# holds its own checkpoint cache, so memory use grows with the count.
+_KERNEL_COUNT = max(1, int(os.environ.get("VIEW_KERNELS", "2")))
+_KERNELS: List[Optional[ProcessPoolExecutor]] = [None] * _KERNEL_COUNT
+
+def _kernel_slot(codes: List[str]) -> int:
+    first = codes[0] if codes else ""
+    return int.from_bytes(hashlib.blake2b(first.encode("utf-8"), digest_size=8).digest(), "big") % _KERNEL_COUNT
+
+def _get_kernel(slot: int) -> ProcessPoolExecutor:
+    if _KERNELS[slot] is None:
+        # spawn: kernels only import backend.runner, never this app
+        _KERNELS[slot] = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=mp.get_context("spawn"),
+        )
+    return _KERNELS[slot]
+
+async def _run_in_kernel(codes: List[str], resume: bool = False) -> ComponentResult:
+    """Run one component's cells in its kernel."""
+    slot = _kernel_slot(codes)
+    pool = _get_kernel(slot)
+    try:
+        return await asyncio.get_running_loop().run_in_executor(pool, run_component, codes, resume)
+    except BrokenProcessPool:
+        # the kernel died (segfault, os._exit, OOM kill); which cell was running is unknown.
+        # Only runs queued on this kernel fail; the next run gets a fresh one.
+        if _KERNELS[slot] is pool:
+            _KERNELS[slot] = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        return ComponentResult([], "Kernel process died while running these cells.", crashed=True)
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    yield
+    for pool in _KERNELS:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(title="Notebook DAG Viewer", version="0.3.0", default_response_class=ORJSONResponse, lifespan=_lifespan)
 
 # --------- Models ----------
 class GraphRequest(BaseModel):
@@ -24,31 +73,35 @@ class GraphRequest(BaseModel):
 
 class RunRequest(BaseModel):
     cells: List[str]
+    resume: bool = False  # restore unchanged leading cells from a checkpoint instead of re-running them
 
 class RunGraphRequest(BaseModel):
     nodes: List[Dict]  # [{id, code, ...}]
     edges: List[Dict]  # [{source, target}]
+    resume: bool = False
 
 # --------- Helpers ----------
-def _run_cell(code: str, env: dict) -> str:
-    """Execute one 'cell' in the shared env. Prints the last expression's repr (like Jupyter)."""
-    buf = io.StringIO()
-    try:
-        tree = ast.parse(code or "", mode="exec")
-        body = list(tree.body)
-        with redirect_stdout(buf):
-            if body and isinstance(body[-1], ast.Expr):
-                prefix = ast.Module(body=body[:-1], type_ignores=[])
-                exec(compile(prefix, "<cell>", "exec"), env, env)
-                value = eval(compile(ast.Expression(body[-1].value), "<cell>", "eval"), env, env)
-                if value is not None:
-                    print(repr(value))
-            else:
-                exec(compile(tree, "<cell>", "exec"), env, env)
-    except Exception:
-        buf.write(traceback.format_exc())
-        raise RuntimeError(buf.getvalue())
-    return buf.getvalue()
+def _save_upload(src, path: Path) -> None:
+    # UploadFile is already spooled; copy it to disk in chunks rather than reading it whole
+    src.seek(0)
+    with path.open("wb") as f:
+        shutil.copyfileobj(src, f, 1024 * 1024)
+
+def _read_code_cells(path: Path) -> List[str]:
+    """Return the source of every code cell. v4 notebooks are parsed directly with orjson;
+       older formats go through nbformat for the upgrade to v4.
+    """
+    data = path.read_bytes()
+    nb_json = orjson.loads(data)
+    if nb_json.get("nbformat", 4) < 4:
+        nb_json = nbf.reads(data.decode("utf-8"), as_version=4)
+    cells = []
+    for c in nb_json.get("cells", []):
+        if c.get("cell_type") != "code":
+            continue
+        src = c.get("source", "")
+        cells.append("".join(src) if isinstance(src, list) else src)
+    return cells
 
 def _topo_sort(nodes: List[Dict], edges: List[Dict]):
     """Return topo ordering per weakly-connected component.
@@ -60,120 +113,123 @@ def _topo_sort(nodes: List[Dict], edges: List[Dict]):
     node_map = {n["id"]: n for n in nodes if (n.get("code") or "").strip()}
     ids = list(node_map.keys())
 
-    # Build adjacency and indegrees only for existing ids
+    # Union-find over ids to group weakly connected components
+    parent: Dict[str, str] = {i: i for i in ids}
+    def find(x: str) -> str:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]  # path halving
+            x = parent[x]
+        return x
+
+    # Pull edge endpoints out once instead of repeated dict lookups per pass
+    src = [e.get("source") for e in edges]
+    dst = [e.get("target") for e in edges]
+
+    # Build adjacency and indegrees only for existing ids; union endpoints as we go
     adj: Dict[str, Set[str]] = {i: set() for i in ids}
     indeg: Dict[str, int] = {i: 0 for i in ids}
-    for e in edges:
-        s, t = e.get("source"), e.get("target")
+    for s, t in zip(src, dst):
         if s in node_map and t in node_map and s != t:
             if t not in adj[s]:
                 adj[s].add(t)
                 indeg[t] += 1
+                rs, rt = find(s), find(t)
+                if rs != rt:
+                    parent[rt] = rs
 
-    # Find weakly connected components (undirected)
-    undirected: Dict[str, Set[str]] = {i: set() for i in ids}
-    for s in ids:
-        for t in adj[s]:
-            undirected[s].add(t)
-            undirected[t].add(s)
-
-    seen = set()
-    components = []
+    # Components keep notebook order: grouped by root, in order of first member
+    groups: Dict[str, List[str]] = {}
     for i in ids:
-        if i in seen: continue
-        # BFS to collect component
-        q = [i]; seen.add(i); comp = []
-        while q:
-            u = q.pop()
-            comp.append(u)
-            for v in undirected[u]:
-                if v not in seen:
-                    seen.add(v); q.append(v)
-        components.append(comp)
-
-    # Topo sort within each component (Kahn)
+        groups.setdefault(find(i), []).append(i)
+    components = list(groups.values())
+
+    # Edges between existing nodes always fall inside a single component
+    edges_by_root: Dict[str, List[Dict]] = {}
+    for k, (s, t) in enumerate(zip(src, dst)):
+        if s in node_map and t in node_map:
+            edges_by_root.setdefault(find(s), []).append(edges[k])
+
+    # Topo sort within each component (Kahn); adj never leaves a component
     ordered_components = []
     for comp in components:
-        indeg_local = {k: indeg[k] for k in comp}
-        adj_local = {k: {v for v in adj[k] if v in comp} for k in comp}
-        q = [k for k in comp if indeg_local[k] == 0]
+        q = deque(k for k in comp if indeg[k] == 0)
         order = []
         while q:
-            u = q.pop(0)
+            u = q.popleft()
             order.append(u)
-            for v in adj_local[u]:
-                indeg_local[v] -= 1
-                if indeg_local[v] == 0:
+            for v in adj[u]:
+                indeg[v] -= 1
+                if indeg[v] == 0:
                     q.append(v)
         # If cycle, remaining nodes will still have indegree>0; append them as-is to avoid deadlock.
-        remaining = [k for k in comp if k not in order]
-        order.extend(remaining)
-        comp_edges = [e for e in edges if e.get("source") in comp and e.get("target") in comp]
-        ordered_components.append((order, comp_edges))
+        placed = set(order)
+        order.extend(k for k in comp if k not in placed)
+        ordered_components.append((order, edges_by_root.get(find(comp[0]), [])))
     return ordered_components, node_map
 
 # --------- Routes ----------
 @app.post("/api/graph")
 async def graph_from_cells(payload: GraphRequest):
-    graph = build_graph(payload.cells)
-    return JSONResponse(graph)
+    graph = await asyncio.to_thread(build_graph, payload.cells)
+    return ORJSONResponse(graph)
 
 @app.post("/api/upload")
 async def upload_notebook(nb: UploadFile = File(...)):
     if not nb.filename.endswith(".ipynb"):
-        return JSONResponse({"error": "Please upload a .ipynb file"}, status_code=400)
+        return ORJSONResponse({"error": "Please upload a .ipynb file"}, status_code=400)
 
-    data = await nb.read()
+    # disk write, notebook parse and graph build run off the event loop
     path = UPLOADS / nb.filename
-    path.write_bytes(data)
+    await asyncio.to_thread(_save_upload, nb.file, path)
 
-    nbnode = nbf.reads(data.decode("utf-8"), as_version=4)
-    raw_cells = [c.get("source", "") for c in nbnode.get("cells", []) if c.get("cell_type") == "code"]
+    raw_cells = await asyncio.to_thread(_read_code_cells, path)
     cells = [c for c in raw_cells if c and c.strip()]  # ignore empties
 
-    graph = build_graph(cells)  # auto infer to start; user can edit connections later in UI
-    return JSONResponse({"filename": nb.filename, "graph": graph})
+    graph = await asyncio.to_thread(build_graph, cells)  # auto infer to start; user can edit connections later in UI
+    return ORJSONResponse({"filename": nb.filename, "graph": graph})
 
 @app.post("/api/run")
 async def run_workflow(payload: RunRequest):
     # legacy: run in given order with shared env
     cells = [c for c in payload.cells if c and c.strip()]
-    env: dict = {}
-    logs = []
-    try:
-        for idx, code in enumerate(cells, start=1):
-            out = _run_cell(code, env)
-            logs.append({"cell": f"cell-{idx}", "stdout": out})
-    except RuntimeError as e:
-        return JSONResponse({"ok": False, "failed_cell": f"cell-{len(logs)+1}", "stdout": str(e), "logs": logs})
-    return JSONResponse({"ok": True, "logs": logs})
+    outs, error, restored, crashed = await _run_in_kernel(cells, payload.resume)
+    logs = [{"cell": f"cell-{idx}", "stdout": out, "restored": idx <= restored}
+            for idx, out in enumerate(outs, start=1)]
+    if error is not None:
+        failed_cell = None if crashed else f"cell-{len(logs)+1}"
+        return ORJSONResponse({"ok": False, "failed_cell": failed_cell, "stdout": error, "logs": logs})
+    return ORJSONResponse({"ok": True, "logs": logs})
 
 @app.post("/api/run_graph")
 async def run_graph(payload: RunGraphRequest):
     """Run all cells per graph dependencies:
-       - Each weakly-connected component runs in its own environment (standalone behavior).
+       - Each weakly-connected component runs in its own environment (standalone behavior);
+         components run concurrently in kernel processes.
        - Within a component, respect topological order (incoming before outgoing).
     """
     ordered_components, node_map = _topo_sort(payload.nodes, payload.edges)
+    orders = [order for order, _comp_edges in ordered_components]
+    comp_codes = [[node_map[nid].get("code") or "" for nid in order] for order in orders]
+
+    # Components share no variables, so they all start concurrently; results are collected
+    # in component order so the response matches a sequential run.
+    tasks = [asyncio.ensure_future(_run_in_kernel(codes, payload.resume)) for codes in comp_codes]
     all_logs = []
-    comp_index = 0
-    for order, _comp_edges in ordered_components:
-        comp_index += 1
-        env: dict = {}
-        for nid in order:
-            code = node_map[nid].get("code") or ""
-            try:
-                out = _run_cell(code, env)
-            except RuntimeError as e:
-                return JSONResponse({
-                    "ok": False,
-                    "failed_node": nid,
-                    "component": comp_index,
-                    "stdout": str(e),
-                    "logs": all_logs
-                })
-            all_logs.append({"node": nid, "component": comp_index, "stdout": out})
-    return JSONResponse({"ok": True, "logs": all_logs})
+    for idx, (order, task) in enumerate(zip(orders, tasks)):
+        outs, error, restored, crashed = await task
+        all_logs.extend({"node": nid, "component": idx + 1, "stdout": out, "restored": k < restored}
+                        for k, (nid, out) in enumerate(zip(order, outs)))
+        if error is not None:
+            for later in tasks[idx + 1:]:
+                later.cancel()  # drops components not yet handed to a kernel; running ones cannot be interrupted
+            return ORJSONResponse({
+                "ok": False,
+                "failed_node": None if crashed else order[len(outs)],
+                "component": idx + 1,
+                "stdout": error,
+                "logs": all_logs
+            })
+    return ORJSONResponse({"ok": True, "logs": all_logs})
 
 # ---- Static frontend ----
 @app.get("/")
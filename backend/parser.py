@@ -1,66 +1,63 @@
 from __future__ import annotations
 import ast
-from typing import Dict, List, Set, Tuple
-
-class NameCollector(ast.NodeVisitor):
-    def __init__(self) -> None:
-        self.defs: Set[str] = set()
-        self.uses: Set[str] = set()
-
-    # definitions
-    def visit_Assign(self, node: ast.Assign):
-        for t in node.targets:
-            self._collect_target(t)
-        self.generic_visit(node)
-
-    def visit_AnnAssign(self, node: ast.AnnAssign):
-        self._collect_target(node.target)
-        self.generic_visit(node)
-
-    def visit_AugAssign(self, node: ast.AugAssign):
-        self._collect_target(node.target)
-        self.generic_visit(node)
-
-    def visit_FunctionDef(self, node: ast.FunctionDef):
-        self.defs.add(node.name)
-        self.generic_visit(node)
-
-    def visit_AsyncFunctionDef(self, node: ast.AsyncFunctionDef):
-        self.defs.add(node.name)
-        self.generic_visit(node)
-
-    def visit_ClassDef(self, node: ast.ClassDef):
-        self.defs.add(node.name)
-        self.generic_visit(node)
-
-    def visit_Import(self, node: ast.Import):
-        for alias in node.names:
-            self.defs.add(alias.asname or alias.name.split(".")[0])
-
-    def visit_ImportFrom(self, node: ast.ImportFrom):
-        for alias in node.names:
-            self.defs.add(alias.asname or alias.name)
-
-    # usages
-    def visit_Name(self, node: ast.Name):
-        if isinstance(node.ctx, ast.Load):
-            self.uses.add(node.id)
-
-    def _collect_target(self, target: ast.AST):
-        if isinstance(target, ast.Name):
-            self.defs.add(target.id)
-        elif isinstance(target, (ast.Tuple, ast.List)):
-            for elt in target.elts:
-                self._collect_target(elt)
-
-def analyze_cell(code: str) -> Tuple[Set[str], Set[str]]:
+from bisect import bisect_left
+from collections import defaultdict
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Set, Tuple
+
+def _collect_targets(targets, defs: Set[str]) -> None:
+    # iterative walk over (possibly nested) tuple/list assignment targets
+    stack = list(targets)
+    Name, Tuple_, List_ = ast.Name, ast.Tuple, ast.List
+    while stack:
+        t = stack.pop()
+        tt = type(t)  # exact type checks: AST node classes are never subclassed here
+        if tt is Name:
+            defs.add(t.id)
+        elif tt is Tuple_ or tt is List_:
+            stack.extend(t.elts)
+
+@lru_cache(maxsize=4096)
+def _analyze_cached(code: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
     try:
         tree = ast.parse(code)
     except SyntaxError:
-        return set(), set()
-    nc = NameCollector()
-    nc.visit(tree)
-    return nc.defs, (nc.uses - nc.defs)
+        return frozenset(), frozenset()
+
+    defs: Set[str] = set()
+    uses: Set[str] = set()
+    Name, Load = ast.Name, ast.Load
+    Assign, AnnAssign, AugAssign = ast.Assign, ast.AnnAssign, ast.AugAssign
+    Import, ImportFrom = ast.Import, ast.ImportFrom
+    named_defs = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+
+    for node in ast.walk(tree):
+        t = type(node)
+        # usages
+        if t is Name:
+            if type(node.ctx) is Load:
+                uses.add(node.id)
+        # definitions
+        elif t is Assign:
+            _collect_targets(node.targets, defs)
+        elif t is AnnAssign or t is AugAssign:
+            _collect_targets((node.target,), defs)
+        elif t in named_defs:
+            defs.add(node.name)
+        elif t is Import:
+            for alias in node.names:
+                defs.add(alias.asname or alias.name.split(".")[0])
+        elif t is ImportFrom:
+            for alias in node.names:
+                defs.add(alias.asname or alias.name)
+    uses.difference_update(defs)
+    return frozenset(defs), frozenset(uses)
+
+def analyze_cell(code: str) -> Tuple[FrozenSet[str], FrozenSet[str]]:
+    """Return (defs, uses) for a cell. Results are cached per source string,
+       so unchanged cells are not re-parsed on repeated graph requests.
+    """
+    return _analyze_cached(code)
 
 def build_graph(cells: List[str]) -> Dict:
     """Return a graph with nodes/edges inferred from notebook cells.
@@ -68,23 +65,36 @@ def build_graph(cells: List[str]) -> Dict:
     """
     # 1) Ignore empty cells
     filtered = [c for c in cells if c and c.strip()]
-    defs_by_cell: List[Set[str]] = []
-    uses_by_cell: List[Set[str]] = []
+    defs_by_cell: List[FrozenSet[str]] = []
+    uses_by_cell: List[FrozenSet[str]] = []
     for code in filtered:
         d, u = analyze_cell(code)
         defs_by_cell.append(d)
         uses_by_cell.append(u)
 
+    # 2) Index producers: name -> ascending list of cells that define it
+    producers: Dict[str, List[int]] = {}
+    for i, defs in enumerate(defs_by_cell):
+        for name in defs:
+            producers.setdefault(name, []).append(i)
+
+    # 3) For each cell, look up earlier producers of the names it uses
+    shared_by_pair: Dict[Tuple[int, int], List[str]] = defaultdict(list)
+    for j, uses in enumerate(uses_by_cell):
+        for name in uses:
+            srcs = producers.get(name)
+            if not srcs:
+                continue
+            for i in srcs[:bisect_left(srcs, j)]:
+                shared_by_pair[(i, j)].append(name)
+
     edges = []
-    for i in range(len(filtered)):
-        for j in range(i + 1, len(filtered)):
-            shared = sorted(defs_by_cell[i].intersection(uses_by_cell[j]))
-            if shared:
-                edges.append({
-                    "source": f"cell-{i+1}",
-                    "target": f"cell-{j+1}",
-                    "labels": shared,
-                })
+    for (i, j) in sorted(shared_by_pair):
+        edges.append({
+            "source": f"cell-{i+1}",
+            "target": f"cell-{j+1}",
+            "labels": sorted(shared_by_pair[(i, j)]),
+        })
 
     nodes = [
         {
@@ -0,0 +1,156 @@
+from __future__ import annotations
+import ast
+import hashlib
+import io
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from functools import lru_cache
+from types import CodeType, ModuleType
+from typing import List, NamedTuple, Optional, Tuple
+import dill
+
+@lru_cache(maxsize=2048)
+def _compile_cell(code: str) -> Tuple[Optional[CodeType], Optional[CodeType]]:
+    """Parse and compile a cell once. Returns (body_code, tail_expr_code), either may be None;
+       the tail expression is split off so its value can be echoed like Jupyter.
+    """
+    tree = ast.parse(code, mode="exec")
+    body = tree.body
+    if not body:
+        return None, None
+    if isinstance(body[-1], ast.Expr):
+        tail = compile(ast.Expression(body[-1].value), "<cell>", "eval")
+        if len(body) == 1:
+            return None, tail
+        prefix = ast.Module(body=body[:-1], type_ignores=[])
+        return compile(prefix, "<cell>", "exec"), tail
+    return compile(tree, "<cell>", "exec"), None
+
+def run_cell(code: str, env: dict) -> str:
+    """Execute one 'cell' in the shared env. Prints the last expression's repr (like Jupyter)."""
+    if not code or not code.strip():
+        return ""
+    buf = io.StringIO()
+    try:
+        body_code, tail_code = _compile_cell(code)
+        if body_code is None and tail_code is None:
+            return ""  # comments only
+        # swap sys.stdout directly rather than through a redirect_stdout context manager
+        stdout, sys.stdout = sys.stdout, buf
+        try:
+            if body_code is not None:
+                exec(body_code, env, env)
+            if tail_code is not None:
+                value = eval(tail_code, env, env)
+                if value is not None:
+                    print(repr(value))
+        finally:
+            sys.stdout = stdout
+    except (Exception, SystemExit):  # sys.exit()/exit() in a cell fails the cell, not the kernel
+        buf.write(traceback.format_exc())
+        raise RuntimeError(buf.getvalue())
+    return buf.getvalue()
+
+# --------- Checkpoints ----------
+# Opt-in (resume=True): a resumed run restores the longest checkpointed prefix of
+# unchanged cells and only executes the rest. Restored cells are not re-executed, so
+# their side effects (file writes, randomness, reads of changed inputs) do not happen
+# again. Each run snapshots the env at most once, right after the first cell slow
+# enough to be worth skipping; later slow cells get their checkpoint on a later
+# resumed run. Envs that cannot be serialized, or outgrow the per-entry cap while
+# being dumped, are simply not checkpointed. Every kernel process keeps its own cache
+# of up to VIEW_CHECKPOINT_MB (default 512) megabytes.
+CHECKPOINT_MAX_BYTES = int(os.environ.get("VIEW_CHECKPOINT_MB", "512")) * 1024 * 1024
+CHECKPOINT_ENTRY_MAX_BYTES = 64 * 1024 * 1024
+CHECKPOINT_MIN_SECONDS = 1.0
+_checkpoints: "OrderedDict[str, Tuple[bytes, List[str], int]]" = OrderedDict()  # key -> (blob, stdouts, size)
+_checkpoint_bytes = 0
+
+def _new_env() -> ModuleType:
+    # a module (rather than a bare dict) lets dill restore functions bound to the restored env
+    return ModuleType("__cell_env__")
+
+def _prefix_keys(codes: List[str]) -> List[str]:
+    h = hashlib.blake2b(digest_size=16)
+    keys = []
+    for code in codes:
+        h.update(code.encode("utf-8"))
+        h.update(b"\0")
+        keys.append(h.hexdigest())
+    return keys
+
+class _CheckpointTooLarge(Exception):
+    pass
+
+class _BoundedBuffer(io.BytesIO):
+    # aborts a dump as soon as it outgrows the limit, rather than serializing the whole env first
+    def __init__(self, limit: int) -> None:
+        super().__init__()
+        self.limit = limit
+
+    def write(self, b) -> int:
+        if self.tell() + len(b) > self.limit:
+            raise _CheckpointTooLarge()
+        return super().write(b)
+
+def _save_checkpoint(key: str, mod: ModuleType, outs: List[str]) -> None:
+    global _checkpoint_bytes
+    out_bytes = sum(len(o) for o in outs)
+    buf = _BoundedBuffer(min(CHECKPOINT_ENTRY_MAX_BYTES, CHECKPOINT_MAX_BYTES) - out_bytes)
+    try:
+        dill.dump_module(buf, module=mod, refimported=True)
+    except Exception:
+        return
+    blob = buf.getvalue()
+    size = len(blob) + out_bytes
+    old = _checkpoints.pop(key, None)
+    if old is not None:
+        _checkpoint_bytes -= old[2]
+    _checkpoints[key] = (blob, list(outs), size)
+    _checkpoint_bytes += size
+    while _checkpoint_bytes > CHECKPOINT_MAX_BYTES:
+        _, evicted = _checkpoints.popitem(last=False)
+        _checkpoint_bytes -= evicted[2]
+
+def _restore_checkpoint(keys: List[str]) -> Tuple[int, ModuleType, List[str]]:
+    """Return (cells_done, env_module, stdouts) for the longest cached prefix of keys."""
+    for done in range(len(keys), 0, -1):
+        entry = _checkpoints.get(keys[done - 1])
+        if entry is None:
+            continue
+        _checkpoints.move_to_end(keys[done - 1])
+        blob, outs, _size = entry
+        try:
+            return done, dill.load_module(io.BytesIO(blob)), list(outs)
+        except Exception:
+            continue
+    return 0, _new_env(), []
+
+class ComponentResult(NamedTuple):
+    outs: List[str]         # stdout per cell, in order, up to the failing cell
+    error: Optional[str]    # traceback of the failing cell, None on success
+    restored: int = 0       # leading cells restored from a checkpoint instead of executed
+    crashed: bool = False   # the kernel process died; the failing cell is unknown
+
+def run_component(codes: List[str], resume: bool = False) -> ComponentResult:
+    """Run one component's cells in order in a fresh env. With resume, the longest
+       checkpointed prefix is restored instead of executed and its stored stdout returned.
+       Picklable, so it can be handed to a process pool.
+    """
+    keys = _prefix_keys(codes)
+    done, mod, outs = _restore_checkpoint(keys) if resume else (0, _new_env(), [])
+    checkpointing = resume
+    for k in range(done, len(codes)):
+        started = time.perf_counter()
+        try:
+            out = run_cell(codes[k], mod.__dict__)
+        except RuntimeError as e:
+            return ComponentResult(outs, str(e), done)
+        outs.append(out)
+        if checkpointing and time.perf_counter() - started >= CHECKPOINT_MIN_SECONDS:
+            _save_checkpoint(keys[k], mod, outs)
+            checkpointing = False  # at most one snapshot per run
+    return ComponentResult(outs, None, done)
@@ -59,6 +59,7 @@ const menuDelConn = document.getElementById("menu-del-conn");
 
 const menuRunCell = document.getElementById("menu-run-cell");
 const menuRunAll = document.getElementById("menu-run-all");
+const menuResume = document.getElementById("menu-resume");
 
 /* Context menu elements */
 const ctx = document.getElementById("ctx");
@@ -281,6 +282,11 @@ function getAncestors(graph, targetId) {
   }
   return anc;
 }
+// Restored cells were not re-executed; their stdout is replayed from the checkpoint
+function formatLog(l) {
+  const tag = l.restored ? " (restored from checkpoint)" : "";
+  return `>>> ${l.node} [component ${l.component}]${tag}\n${l.stdout || "(no output)"}\n`;
+}
 async function runSelectedCell() {
   if (!selectedNodeId) {
     runOut.textContent = "Select a node first.";
@@ -296,28 +302,29 @@ async function runSelectedCell() {
     .map(e => ({ source: e.source, target: e.target }));
 
   runOut.textContent = `Running ancestors + ${selectedNodeId}...\n`;
-  const res = await postJSON("/api/run_graph", { nodes, edges });
+  const res = await postJSON("/api/run_graph", { nodes, edges, resume: menuResume.checked });
   if (res.ok) {
-    const lines = res.logs.map(l => `>>> ${l.node} [component ${l.component}]\n${l.stdout || "(no output)"}\n`);
+    const lines = res.logs.map(formatLog);
     runOut.textContent = lines.join("\n");
   } else {
-    const lines = (res.logs || []).map(l => `>>> ${l.node} [component ${l.component}]\n${l.stdout || "(no output)"}\n`);
-    runOut.textContent = lines.join("\n") + `\n✖ Failed at ${res.failed_node} (component ${res.component})\n${res.stdout}`;
+    const lines = (res.logs || []).map(formatLog);
+    runOut.textContent = lines.join("\n") + `\n✖ Failed ${res.failed_node ? `at ${res.failed_node} ` : ""}(component ${res.component})\n${res.stdout}`;
   }
 }
 async function runAll() {
   const payload = {
     nodes: currentGraph.nodes.map(n => ({ id: n.id, code: n.code || "" })),
     edges: currentGraph.edges.map(e => ({ source: e.source, target: e.target })),
+    resume: menuResume.checked,
   };
   runOut.textContent = "Running all components (topological order)...\n";
   const res = await postJSON("/api/run_graph", payload);
   if (res.ok) {
-    const lines = res.logs.map(l => `>>> ${l.node} [component ${l.component}]\n${l.stdout || "(no output)"}\n`);
+    const lines = res.logs.map(formatLog);
     runOut.textContent = lines.join("\n");
   } else {
-    const lines = (res.logs || []).map(l => `>>> ${l.node} [component ${l.component}]\n${l.stdout || "(no output)"}\n`);
-    runOut.textContent = lines.join("\n") + `\n✖ Failed at ${res.failed_node} (component ${res.component})\n${res.stdout}`;
+    const lines = (res.logs || []).map(formatLog);
+    runOut.textContent = lines.join("\n") + `\n✖ Failed ${res.failed_node ? `at ${res.failed_node} ` : ""}(component ${res.component})\n${res.stdout}`;
   }
 }
 